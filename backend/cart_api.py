@@ -0,0 +1,291 @@
+"""
+Delta-based cart mutation API for the storefront.
+
+``CartContext.tsx`` used to write a single row to the ``cart`` table and then
+re-read the whole cart joined to ``products`` after every click. This module
+exposes a cart endpoint that:
+
+* Accepts a batch of operations and applies them in one transaction.
+* Addresses lines by the ``UNIQUE(user_id, product_id, size, color)`` key (or
+  by row id), so repeated adds of the same variant merge into one line.
+* Returns only the rows that changed plus the cart version counter kept in
+  ``cart_versions`` by a trigger on ``cart``.
+
+A client that sends the version it currently holds gets a delta it can apply
+locally; a stale version is answered with ``409`` so the client knows it must
+reload the cart once.
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.db import models, transaction
+from django.http import HttpRequest, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from backend.catalog_api import Product
+from backend.supabase_auth import SupabaseAuthError, supabase_user_id
+
+
+class CartItem(models.Model):
+    """Cart line (``cart`` table, owned by Supabase)."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    user_id = models.UUIDField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_column="product_id")
+    quantity = models.IntegerField()
+    size = models.TextField(default="")
+    color = models.TextField(default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        managed = False
+        db_table = "cart"
+
+
+class CartVersion(models.Model):
+    """Per-user cart version counter, bumped by the ``cart_bump_version`` trigger."""
+
+    user_id = models.UUIDField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        managed = False
+        db_table = "cart_versions"
+
+
+CartKey = Tuple[str, str, str]
+
+OPERATIONS = {"set", "add", "remove"}
+
+# Largest quantity a line may hold; keeps ``cart.quantity`` well inside ``integer``.
+MAX_QUANTITY = 9_999
+
+
+class InvalidOperation(ValueError):
+    """Raised when a cart operation in the batch is malformed."""
+
+
+class UnknownProduct(InvalidOperation):
+    """Raised when an operation would create a line for a product that does not exist."""
+
+
+@dataclass
+class CartOperation:
+    """
+    One mutation of the batch.
+
+    * ``set``: set the line quantity, creating the line if needed.
+    * ``add``: add ``quantity`` to the line, creating it if needed.
+    * ``remove``: delete the line.
+
+    A resulting quantity of zero or less removes the line, mirroring the
+    ``quantity > 0`` check constraint on ``cart``.
+    """
+
+    op: str
+    item_id: Optional[str] = None
+    product_id: Optional[str] = None
+    size: str = ""
+    color: str = ""
+    quantity: int = 0
+
+    @classmethod
+    def from_payload(cls, raw: Dict[str, Any]) -> "CartOperation":
+        try:
+            op = str(raw["op"])
+            quantity = int(raw.get("quantity", 0))
+            item_id = str(uuid.UUID(str(raw["id"]))) if raw.get("id") else None
+            product_id = str(uuid.UUID(str(raw["product_id"]))) if raw.get("product_id") else None
+        except (KeyError, TypeError, ValueError) as exc:
+            raise InvalidOperation(raw) from exc
+        if op not in OPERATIONS or not (item_id or product_id) or abs(quantity) > MAX_QUANTITY:
+            raise InvalidOperation(raw)
+        return cls(
+            op=op,
+            item_id=item_id,
+            product_id=product_id,
+            size=str(raw.get("size") or ""),
+            color=str(raw.get("color") or ""),
+            quantity=quantity,
+        )
+
+
+def _key(item: CartItem) -> CartKey:
+    return (str(item.product_id), item.size, item.color)
+
+
+def _lock_version(user_id: str) -> CartVersion:
+    """Create the user's version row if needed and lock it for the transaction."""
+
+    CartVersion.objects.bulk_create([CartVersion(user_id=user_id)], ignore_conflicts=True)
+    return CartVersion.objects.select_for_update().get(pk=user_id)
+
+
+def _serialize(items: Iterable[CartItem]) -> List[Dict[str, Any]]:
+    items = list(items)
+    products = {
+        str(row["id"]): row
+        for row in Product.objects.filter(id__in={item.product_id for item in items}).values(
+            "id", "name", "price", "image_url"
+        )
+    }
+    return [
+        {
+            "id": item.id,
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+            "size": item.size,
+            "color": item.color,
+            "product": {key: value for key, value in products.get(str(item.product_id), {}).items() if key != "id"} or None,
+        }
+        for item in items
+    ]
+
+
+def apply_operations(user_id: str, base_version: Optional[int], operations: List[CartOperation]) -> Dict[str, Any]:
+    """
+    Apply ``operations`` to the user's cart in a single transaction.
+
+    Returns the changed rows, the ids of removed rows and the new version. When
+    ``base_version`` is given and does not match the stored version, nothing is
+    written and ``{"stale": True, "version": ...}`` is returned instead.
+    Raises :class:`UnknownProduct` when a new line would reference a missing
+    product, and :class:`InvalidOperation` when a line would exceed
+    ``MAX_QUANTITY``; nothing is written in either case.
+    """
+
+    with transaction.atomic():
+        version = _lock_version(user_id)
+        if base_version is not None and base_version != version.version:
+            return {"stale": True, "version": version.version}
+
+        existing = list(CartItem.objects.select_for_update().filter(user_id=user_id))
+        by_id = {str(item.id): item for item in existing}
+        by_key = {_key(item): item for item in existing}
+
+        created: Dict[CartKey, CartItem] = {}
+        updated: Dict[str, CartItem] = {}
+        removed: Dict[str, CartItem] = {}
+
+        for operation in operations:
+            if operation.item_id is not None:
+                item = by_id.get(operation.item_id)
+                if item is None:
+                    continue
+                key = _key(item)
+            else:
+                key = (operation.product_id, operation.size, operation.color)
+                item = by_key.get(key)
+
+            if operation.op == "remove":
+                quantity = 0
+            elif operation.op == "add":
+                quantity = (item.quantity if item is not None else 0) + operation.quantity
+            else:
+                quantity = operation.quantity
+            if quantity > MAX_QUANTITY:
+                raise InvalidOperation(operation)
+
+            if item is None:
+                if quantity <= 0 or operation.product_id is None:
+                    continue
+                item = CartItem(
+                    user_id=user_id,
+                    product_id=operation.product_id,
+                    quantity=quantity,
+                    size=operation.size,
+                    color=operation.color,
+                )
+                by_key[key] = item
+                by_id[str(item.id)] = item
+                created[key] = item
+            elif quantity <= 0:
+                del by_key[key]
+                del by_id[str(item.id)]
+                if created.pop(key, None) is None:
+                    updated.pop(str(item.id), None)
+                    removed[str(item.id)] = item
+            else:
+                item.quantity = quantity
+                if key not in created:
+                    updated[str(item.id)] = item
+
+        if created:
+            new_products = {str(item.product_id) for item in created.values()}
+            known = {str(pk) for pk in Product.objects.filter(id__in=new_products).values_list("id", flat=True)}
+            if new_products - known:
+                raise UnknownProduct(sorted(new_products - known))
+
+        if removed:
+            CartItem.objects.filter(user_id=user_id, id__in=list(removed)).delete()
+        if updated:
+            CartItem.objects.bulk_update(list(updated.values()), ["quantity"])
+        if created:
+            CartItem.objects.bulk_create(list(created.values()))
+
+        version.refresh_from_db(fields=["version"])
+
+    return {
+        "stale": False,
+        "version": version.version,
+        "changed": _serialize([*created.values(), *updated.values()]),
+        "removed": list(removed),
+    }
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class CartView(View):
+    """
+    Cart endpoint for the Supabase user of the bearer token.
+
+    ``GET`` returns the full cart and its version; it is only needed on first
+    load or after a ``409``. ``POST`` takes a JSON body
+    ``{"version": <int>, "operations": [...]}`` and returns the delta.
+
+    Authentication relies on the ``Authorization`` header rather than cookies,
+    hence the CSRF exemption.
+    """
+
+    def get(self, request: HttpRequest) -> JsonResponse:
+        try:
+            user_id = str(supabase_user_id(request))
+        except SupabaseAuthError:
+            return JsonResponse({"status": "error", "message": "auth"}, status=401)
+        with transaction.atomic():
+            version = _lock_version(user_id)
+            items = _serialize(CartItem.objects.filter(user_id=user_id).order_by("created_at"))
+        return JsonResponse({"status": "ok", "version": version.version, "items": items})
+
+    def post(self, request: HttpRequest) -> JsonResponse:
+        try:
+            user_id = str(supabase_user_id(request))
+        except SupabaseAuthError:
+            return JsonResponse({"status": "error", "message": "auth"}, status=401)
+        try:
+            payload = json.loads(request.body or b"{}")
+            base_version = payload.get("version")
+            base_version = int(base_version) if base_version is not None else None
+            operations = [CartOperation.from_payload(raw) for raw in payload.get("operations", [])]
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({"status": "error", "message": "operations"}, status=400)
+
+        if not operations:
+            return JsonResponse({"status": "error", "message": "vide"}, status=400)
+
+        try:
+            result = apply_operations(user_id, base_version, operations)
+        except UnknownProduct as exc:
+            return JsonResponse({"status": "error", "message": "produit", "produits": exc.args[0]}, status=400)
+        except InvalidOperation:
+            return JsonResponse({"status": "error", "message": "quantite"}, status=400)
+        if result.pop("stale"):
+            return JsonResponse({"status": "error", "message": "stale", **result}, status=409)
+        return JsonResponse({"status": "ok", **result})
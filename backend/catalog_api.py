@@ -0,0 +1,214 @@
+"""
+Server-side catalog API for the storefront product grid.
+
+The React storefront used to load the whole ``products`` table (plus the
+categories) through Supabase on every visit. This module serves the same data
+from Django over the tables created by the Supabase migrations:
+
+* Keyset pagination on ``(featured, created_at, id)``, expressed as a row
+  comparison, so every page costs one index range scan regardless of how deep
+  the shopper scrolls.
+* Optional filtering on the category slug.
+* A trimmed projection for list views (no ``images`` gallery, no full
+  ``description``).
+* Response caching keyed on ``catalog_state.version`` with ETag /
+  ``If-None-Match`` support. The version is bumped by database triggers on any
+  write to ``products`` or ``categories``, so cached pages are invalidated
+  whichever client performed the write.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags
+from django.views import View
+
+from backend.pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+
+
+class Category(models.Model):
+    """Storefront category (``categories`` table, owned by Supabase)."""
+
+    id = models.UUIDField(primary_key=True)
+    name = models.TextField()
+    slug = models.TextField(unique=True)
+    description = models.TextField(default="")
+    image_url = models.TextField(default="")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = "categories"
+
+
+class Product(models.Model):
+    """Storefront product (``products`` table, owned by Supabase)."""
+
+    id = models.UUIDField(primary_key=True)
+    name = models.TextField()
+    slug = models.TextField(unique=True)
+    description = models.TextField(default="")
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, db_column="category_id")
+    image_url = models.TextField(default="")
+    images = models.JSONField(default=list)
+    sizes = models.JSONField(default=list)
+    colors = models.JSONField(default=list)
+    stock = models.IntegerField(default=0)
+    featured = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = "products"
+
+
+class CatalogState(models.Model):
+    """Single-row version counter maintained by triggers on the catalog tables."""
+
+    id = models.SmallIntegerField(primary_key=True)
+    version = models.BigIntegerField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = "catalog_state"
+
+
+# Fields returned by the list view. ``images`` and ``description`` are only
+# needed on the product page and are deliberately left out.
+LIST_FIELDS = (
+    "id",
+    "name",
+    "slug",
+    "price",
+    "image_url",
+    "sizes",
+    "colors",
+    "stock",
+    "featured",
+    "created_at",
+    "category__slug",
+)
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+CACHE_TIMEOUT = 60 * 15
+
+
+def catalog_version() -> int:
+    """Return the current catalog version, ``0`` if the state row is missing."""
+
+    version = CatalogState.objects.filter(pk=1).values_list("version", flat=True).first()
+    return version or 0
+
+
+def _cursor_featured(value: Any) -> bool:
+    if not isinstance(value, bool):
+        raise ValueError(value)
+    return value
+
+
+def _cursor_id(value: Any) -> str:
+    return str(uuid.UUID(str(value)))
+
+
+def fetch_page(category_slug: Optional[str], cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    """Return one page of the product grid in ``featured, created_at, id`` descending order."""
+
+    queryset = Product.objects.order_by("-featured", "-created_at", "-id")
+    if category_slug:
+        category_id = Category.objects.filter(slug=category_slug).values_list("id", flat=True).first()
+        if category_id is None:
+            return {"results": [], "next_cursor": None}
+        queryset = queryset.filter(category_id=category_id)
+    if cursor:
+        # A row comparison is used as the lower bound of the index range scan;
+        # the equivalent OR chain would only be applied as a filter.
+        queryset = queryset.filter(
+            RawSQL(
+                '("products"."featured", "products"."created_at", "products"."id") < (%s, %s, %s)',
+                decode_cursor(cursor, _cursor_featured, datetime.fromisoformat, _cursor_id),
+                output_field=BooleanField(),
+            )
+        )
+
+    # Fetch one extra row to know whether another page exists without a COUNT.
+    rows: List[Dict[str, Any]] = list(queryset.values(*LIST_FIELDS)[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for row in rows:
+        row["category_slug"] = row.pop("category__slug")
+
+    return {
+        "results": rows,
+        "next_cursor": encode_cursor(rows[-1]["featured"], rows[-1]["created_at"], str(rows[-1]["id"])) if has_more else None,
+    }
+
+
+class CatalogListView(View):
+    """
+    Paginated product list for the storefront grid.
+
+    Query parameters:
+    * ``category``: optional category slug.
+    * ``cursor``: opaque token returned as ``next_cursor`` by the previous page.
+    * ``limit``: page size, capped at ``MAX_PAGE_SIZE``.
+    """
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        category_slug = request.GET.get("category") or None
+        cursor = request.GET.get("cursor") or None
+        try:
+            limit = parse_limit(request, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        except ValueError:
+            return JsonResponse({"status": "error", "message": "limit"}, status=400)
+
+        version = catalog_version()
+        cache_key = "catalog:list:{}:{}".format(
+            version,
+            hashlib.sha1(f"{category_slug}|{cursor}|{limit}".encode()).hexdigest(),
+        )
+        cached = cache.get(cache_key)
+        if cached is None:
+            try:
+                page = fetch_page(category_slug, cursor, limit)
+            except InvalidCursor:
+                return JsonResponse({"status": "error", "message": "cursor"}, status=400)
+            body = json.dumps(page, cls=DjangoJSONEncoder).encode()
+            etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            cached = (etag, body)
+            cache.set(cache_key, cached, CACHE_TIMEOUT)
+
+        etag, body = cached
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response: HttpResponse = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, max-age=0, must-revalidate"
+        return response
+
+
+class CategoryListView(View):
+    """Category list used by the storefront filter, cached on the catalog version."""
+
+    def get(self, request: HttpRequest) -> JsonResponse:
+        cache_key = f"catalog:categories:{catalog_version()}"
+        categories = cache.get(cache_key)
+        if categories is None:
+            categories = list(Category.objects.order_by("name").values("id", "name", "slug", "image_url"))
+            cache.set(cache_key, categories, CACHE_TIMEOUT)
+        return JsonResponse({"results": categories})
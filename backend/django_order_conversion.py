@@ -57,7 +57,7 @@ from typing import Iterable, List
 
 from django.conf import settings
 from django.db import models, transaction
-from django.db.models import F
+from django.db.models import F, Q
 from django.http import HttpRequest, JsonResponse
 from django.utils import timezone
 from django.views import View
@@ -97,6 +97,18 @@ class DetailProd(models.Model):
     qte = models.PositiveIntegerField(default=0)
     etat = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Stock lookups and decrements always target the active row of a
+            # product in a store; covering ``qte`` allows index-only reads.
+            models.Index(
+                fields=["magasin", "produit"],
+                include=["qte"],
+                condition=Q(etat=True),
+                name="detailprod_active_stock_idx",
+            ),
+        ]
+
 
 class CommandeClient(models.Model):
     """Client order header."""
@@ -115,6 +127,14 @@ class CommandeClient(models.Model):
     magasin = models.ForeignKey(Magasin, on_delete=models.PROTECT)
     point_de_vente = models.ForeignKey(PointDeVente, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["client", "etat", "actif"], name="cmdclt_client_etat_actif_idx"),
+            models.Index(fields=["client", "-created_at", "-id"], name="cmdclt_client_history_idx"),
+            models.Index(fields=["code"], name="cmdclt_code_idx"),
+            models.Index(fields=["created_at"], name="cmdclt_created_at_idx"),
+        ]
+
 
 class DetailCommandeClient(models.Model):
     """Line item attached to a client order."""
@@ -144,6 +164,12 @@ class Livraison(models.Model):
     magasin = models.ForeignKey(Magasin, on_delete=models.PROTECT)
     point_de_vente = models.ForeignKey(PointDeVente, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["code"], name="livraison_code_idx"),
+            models.Index(fields=["created_at"], name="livraison_created_at_idx"),
+        ]
+
 
 class DetailLivraison(models.Model):
     """Delivery line item."""
@@ -155,6 +181,11 @@ class DetailLivraison(models.Model):
     etat = models.PositiveSmallIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["produit", "created_at"], name="detailliv_produit_created_idx"),
+        ]
+
 
 class MouvementCaisse(models.Model):
     """Cash register movement used when the order is immediately settled."""
@@ -166,6 +197,75 @@ class MouvementCaisse(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
 
+class MouvementStock(models.Model):
+    """Append-only journal of stock movements; ``delta`` is signed."""
+
+    SOURCE_OUVERTURE = "ouverture"
+    SOURCE_INVENTAIRE = "inventaire"
+    SOURCE_LIVRAISON = "livraison"
+    SOURCE_AJUSTEMENT = "ajustement"
+    SOURCES = [
+        (SOURCE_OUVERTURE, "Ouverture du journal"),
+        (SOURCE_INVENTAIRE, "Inventaire"),
+        (SOURCE_LIVRAISON, "Livraison client"),
+        (SOURCE_AJUSTEMENT, "Ajustement manuel"),
+    ]
+
+    produit = models.ForeignKey(Produit, on_delete=models.PROTECT)
+    magasin = models.ForeignKey(Magasin, on_delete=models.PROTECT)
+    delta = models.IntegerField()
+    source = models.CharField(max_length=20, choices=SOURCES)
+    reference = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Replays read a store's movements above a checkpoint's id mark.
+            models.Index(fields=["magasin", "id"], name="mvtstock_mag_id_idx"),
+            models.Index(fields=["magasin", "produit", "id"], name="mvtstock_mag_prod_id_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("stock movements are append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("stock movements are append-only")
+
+
+class StockCheckpoint(models.Model):
+    """
+    Stock levels of a store, the starting point of journal replays.
+
+    The checkpoint covers exactly the movements with ``id <= last_mouvement_id``;
+    ``created_at`` stamps are taken before commit, so replays go by id.
+    """
+
+    magasin = models.ForeignKey(Magasin, on_delete=models.PROTECT)
+    taken_at = models.DateTimeField()
+    last_mouvement_id = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["magasin", "taken_at"], name="stockcheckpoint_mag_taken_uniq"),
+        ]
+
+
+class StockCheckpointLine(models.Model):
+    """Quantity of one product in a checkpoint."""
+
+    checkpoint = models.ForeignKey(StockCheckpoint, on_delete=models.CASCADE, related_name="lines")
+    produit = models.ForeignKey(Produit, on_delete=models.PROTECT)
+    qte = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["checkpoint", "produit"], name="stockcheckpointline_uniq"),
+        ]
+
+
 @dataclass
 class CartLine:
     produit_id: int
@@ -189,7 +289,7 @@ class CreateClientOrderView(View):
     * Read cart lines from the session key ``CMDCLT``.
     * Validate client, available credit, and totals.
     * Create the order header, order lines, optional payment, and optional delivery.
-    * Update stock quantities atomically.
+    * Update stock quantities atomically and record them in the stock journal.
     """
 
     def post(self, request: HttpRequest) -> JsonResponse:  # type: ignore[override]
@@ -252,7 +352,7 @@ class CreateClientOrderView(View):
 
             if liv:
                 livraison = self._create_delivery(commande, cart_lines, lib_cmd, lib_liv, tva, remise, dat_cmd)
-                self._update_stock(cart_lines, magasin)
+                self._update_stock(cart_lines, magasin, livraison)
                 commande.actif = True
                 commande.save(update_fields=["actif"])
 
@@ -339,6 +439,23 @@ class CreateClientOrderView(View):
         return livraison
 
     @staticmethod
-    def _update_stock(cart_lines: Iterable[CartLine], magasin: Magasin) -> None:
-        for line in cart_lines:
-            DetailProd.objects.filter(produit_id=line.produit_id, magasin=magasin, etat=True).update(qte=F("qte") - line.qte)
+    def _update_stock(cart_lines: Iterable[CartLine], magasin: Magasin, livraison: Livraison) -> None:
+        # Only journal the lines that moved an active stock row, so the journal
+        # never drifts from ``DetailProd``.
+        moved = [
+            line
+            for line in cart_lines
+            if DetailProd.objects.filter(produit_id=line.produit_id, magasin=magasin, etat=True).update(
+                qte=F("qte") - line.qte
+            )
+        ]
+        MouvementStock.objects.bulk_create(
+            MouvementStock(
+                produit_id=line.produit_id,
+                magasin=magasin,
+                delta=-line.qte,
+                source=MouvementStock.SOURCE_LIVRAISON,
+                reference=livraison.code,
+            )
+            for line in moved
+        )
@@ -0,0 +1,213 @@
+"""
+Client order history API.
+
+Order history screens used to iterate ``CommandeClient`` rows and touch
+``.details``, the client, the store and the point of sale for each of them,
+issuing several queries per order. This module serves the history with a fixed
+number of queries per page:
+
+* Keyset pagination on ``(created_at, id)`` instead of ``OFFSET``.
+* ``select_related`` for the client, store and point of sale, and batched
+  prefetches for the order lines and the deliveries with their lines.
+* Per-order totals (gross, net, paid, balance) computed by the database as
+  correlated subqueries, so the line and payment joins never multiply rows.
+* Finished orders (``etat=1`` and ``actif=True``) never change, so their
+  summaries are cached and skipped entirely by the heavy query on later pages.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+from django.db.models import DecimalField, F, OuterRef, Prefetch, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpRequest, JsonResponse
+from django.views import View
+
+from backend.django_order_conversion import (
+    CommandeClient,
+    DetailCommandeClient,
+    DetailLivraison,
+    Livraison,
+    MouvementCaisse,
+)
+from backend.pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24
+
+AMOUNT = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Value(Decimal("0"), output_field=AMOUNT)
+
+
+def summary_cache_key(commande_id: int) -> str:
+    return f"order-history:summary:{commande_id}"
+
+
+def is_finished(etat: int, actif: bool) -> bool:
+    """A settled and delivered order can no longer change."""
+
+    return etat == 1 and actif
+
+
+def _with_totals(queryset):
+    """Annotate ``gross_total``, ``paid_total``, ``net_total`` and ``balance``."""
+
+    gross = (
+        DetailCommandeClient.objects.filter(commande=OuterRef("pk"))
+        .values("commande")
+        .annotate(total=Sum(F("pv") * F("qte"), output_field=AMOUNT))
+        .values("total")
+    )
+    paid = (
+        MouvementCaisse.objects.filter(commande=OuterRef("pk"))
+        .values("commande")
+        .annotate(total=Sum("montant"))
+        .values("total")
+    )
+    return queryset.annotate(
+        gross_total=Coalesce(Subquery(gross, output_field=AMOUNT), ZERO),
+        paid_total=Coalesce(Subquery(paid, output_field=AMOUNT), ZERO),
+    ).annotate(
+        net_total=F("gross_total") - F("remise") + F("tva"),
+        balance=F("gross_total") - F("remise") + F("tva") - F("paid_total"),
+    )
+
+
+def _summarize(commande: CommandeClient) -> Dict[str, Any]:
+    return {
+        "id": commande.id,
+        "code": commande.code,
+        "lib": commande.lib,
+        "dat_cmd": commande.dat_cmd,
+        "created_at": commande.created_at,
+        "etat": commande.etat,
+        "actif": commande.actif,
+        "client": {"id": commande.client_id, "name": commande.client.name},
+        "magasin": {"id": commande.magasin_id, "name": commande.magasin.name},
+        "point_de_vente": {"id": commande.point_de_vente_id, "name": commande.point_de_vente.name},
+        "remise": commande.remise,
+        "tva": commande.tva,
+        "gross_total": commande.gross_total,
+        "net_total": commande.net_total,
+        "paid_total": commande.paid_total,
+        "balance": commande.balance,
+        "details": [
+            {
+                "id": detail.id,
+                "produit": {"id": detail.produit_id, "name": detail.produit.name},
+                "qte": detail.qte,
+                "pv": detail.pv,
+                "commission": detail.commission,
+                "montant": detail.pv * detail.qte,
+            }
+            for detail in commande.details.all()
+        ],
+        "livraisons": [
+            {
+                "id": livraison.id,
+                "code": livraison.code,
+                "dat_liv": livraison.dat_liv,
+                "etat": livraison.etat,
+                "details": [
+                    {"produit_id": detail.produit_id, "qte": detail.qte, "pa": detail.pa}
+                    for detail in livraison.details.all()
+                ],
+            }
+            for livraison in commande.livraison_set.all()
+        ],
+    }
+
+
+def load_summaries(commande_ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+    """Build summaries for ``commande_ids`` with one query per relation, not per order."""
+
+    if not commande_ids:
+        return {}
+    queryset = _with_totals(
+        CommandeClient.objects.filter(pk__in=commande_ids)
+        .select_related("client", "magasin", "point_de_vente")
+        .prefetch_related(
+            Prefetch(
+                "details",
+                queryset=DetailCommandeClient.objects.select_related("produit").order_by("id"),
+            ),
+            Prefetch(
+                "livraison_set",
+                queryset=Livraison.objects.order_by("id").prefetch_related(
+                    Prefetch("details", queryset=DetailLivraison.objects.order_by("id"))
+                ),
+            ),
+        )
+    )
+    return {commande.id: _summarize(commande) for commande in queryset}
+
+
+def fetch_history(client_id: int, cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    """Return one page of ``client_id``'s orders, newest first."""
+
+    queryset = CommandeClient.objects.filter(client_id=client_id).order_by("-created_at", "-id")
+    if cursor:
+        created_at, commande_id = decode_cursor(cursor, datetime.fromisoformat, int)
+        # ``created_at__lte`` bounds the history index range scan; the OR only
+        # breaks ties on the boundary timestamp.
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=commande_id),
+            created_at__lte=created_at,
+        )
+
+    # The page itself only needs the keyset columns and the state flags.
+    page: List[Tuple[int, datetime, int, bool]] = list(
+        queryset.values_list("id", "created_at", "etat", "actif")[: limit + 1]
+    )
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    finished = [commande_id for commande_id, _created, etat, actif in page if is_finished(etat, actif)]
+    cached = cache.get_many([summary_cache_key(commande_id) for commande_id in finished])
+    summaries: Dict[int, Dict[str, Any]] = {
+        commande_id: cached[summary_cache_key(commande_id)]
+        for commande_id in finished
+        if summary_cache_key(commande_id) in cached
+    }
+
+    loaded = load_summaries([row[0] for row in page if row[0] not in summaries])
+    summaries.update(loaded)
+    cache.set_many(
+        {
+            summary_cache_key(commande_id): summary
+            for commande_id, summary in loaded.items()
+            if is_finished(summary["etat"], summary["actif"])
+        },
+        SUMMARY_CACHE_TIMEOUT,
+    )
+
+    last = page[-1] if page else None
+    return {
+        "results": [summaries[row[0]] for row in page if row[0] in summaries],
+        "next_cursor": encode_cursor(last[1], last[0]) if has_more and last else None,
+    }
+
+
+class OrderHistoryView(View):
+    """
+    Paginated order history of a client.
+
+    Query parameters:
+    * ``cursor``: opaque token returned as ``next_cursor`` by the previous page.
+    * ``limit``: page size, capped at ``MAX_PAGE_SIZE``.
+    """
+
+    def get(self, request: HttpRequest, client_id: int) -> JsonResponse:
+        try:
+            limit = parse_limit(request, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+            page = fetch_history(int(client_id), request.GET.get("cursor") or None, limit)
+        except InvalidCursor:
+            return JsonResponse({"status": "error", "message": "cursor"}, status=400)
+        except ValueError:
+            return JsonResponse({"status": "error", "message": "limit"}, status=400)
+        return JsonResponse({"status": "ok", **page})
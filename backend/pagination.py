@@ -0,0 +1,44 @@
+"""
+Keyset pagination helpers shared by the list APIs.
+
+A cursor is the keyset position of the last row of a page, JSON-encoded and
+wrapped in URL-safe base64 so clients treat it as an opaque token.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Tuple
+
+from django.http import HttpRequest
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode a keyset position; datetimes are stored in ISO 8601."""
+
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values], default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, *converters: Callable[[Any], Any]) -> Tuple[Any, ...]:
+    """Decode a token from :func:`encode_cursor`, applying one converter per value."""
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(converters):
+            raise ValueError(token)
+        return tuple(convert(value) for convert, value in zip(converters, values))
+    except (TypeError, ValueError) as exc:
+        raise InvalidCursor(token) from exc
+
+
+def parse_limit(request: HttpRequest, default: int, maximum: int) -> int:
+    """Read the ``limit`` query parameter, clamped to ``[1, maximum]``; raises ``ValueError``."""
+
+    return min(max(int(request.GET.get("limit", default)), 1), maximum)
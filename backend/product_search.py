@@ -0,0 +1,354 @@
+"""
+Product search for the storefront and the tills.
+
+Searching used to mean ``ILIKE`` scans over ``products.name`` / ``description``
+or client-side filtering in ``CategoryFilter.tsx``, both slow and sensitive to
+accents ("Robe Élégante" vs "robe elegante"). This module provides an
+accent-folding, prefix-capable inverted index over the product name,
+description, colors and sizes with two interchangeable backends:
+
+* ``PostgresProductIndex`` queries the ``products.search_vector`` tsvector and
+  the trigram index on the folded name, both maintained by the database on
+  every product write (see the ``add_product_search`` migration).
+* ``InMemoryProductIndex`` keeps the inverted index in process, for tests and
+  small deployments. Products are written through Supabase as well as Django,
+  so a trigger records each changed product in ``product_search_changes``
+  with the id of the writing transaction (see the
+  ``add_product_search_changes`` migration). Each process re-indexes only the
+  products changed since its last refresh.
+
+The backend is chosen with the ``PRODUCT_SEARCH_BACKEND`` setting
+(``"postgres"``, the default, or ``"memory"``).
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpRequest, JsonResponse
+from django.views import View
+
+from backend.catalog_api import Product
+from backend.pagination import parse_limit
+
+# Relative weight of each field, mirroring the A/B/C weights of the tsvector.
+FIELD_WEIGHTS = {"name": 3.0, "colors": 2.0, "sizes": 2.0, "description": 1.0}
+# Score factor applied when a query token only matches a term by prefix.
+PREFIX_FACTOR = 0.6
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+DOCUMENT_FIELDS = ("id", "name", "slug", "price", "image_url", "description", "colors", "sizes")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lowercase ``text`` and strip its accents: ``"Élégante"`` -> ``"elegante"``."""
+
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(fold(text))
+
+
+# Transactions below the snapshot ``xmin`` are finished, so every change they
+# made is visible now; changes at or above it may still commit and are read
+# again by the next refresh. Re-indexing a product twice is harmless.
+SNAPSHOT_XMIN = "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+CHANGES_SQL = f"""
+    SELECT {SNAPSHOT_XMIN},
+           ARRAY(SELECT product_id::text FROM product_search_changes WHERE txid >= %s)
+"""
+
+
+def change_mark() -> int:
+    """Return the current mark, the starting point of :func:`changes_since`."""
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {SNAPSHOT_XMIN}")
+        return cursor.fetchone()[0]
+
+
+def changes_since(mark: int) -> Tuple[int, List[str]]:
+    """Return a new mark and the ids of the products changed at or above ``mark``."""
+
+    with connection.cursor() as cursor:
+        cursor.execute(CHANGES_SQL, [mark])
+        new_mark, product_ids = cursor.fetchone()
+    return new_mark, list(product_ids)
+
+
+@dataclass
+class SearchHit:
+    id: str
+    name: str
+    slug: str
+    price: Decimal
+    image_url: str
+    score: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "slug": self.slug,
+            "price": self.price,
+            "image_url": self.image_url,
+            "score": round(self.score, 6),
+        }
+
+
+class InMemoryProductIndex:
+    """
+    Inverted index kept in process.
+
+    Postings map each folded term to ``{product_id: weighted term frequency}``.
+    A sorted term list serves prefix lookups with ``bisect``. Every query token
+    must match (exactly or as a prefix), and documents are ranked by the sum of
+    their best weighted, IDF-scaled match per token.
+
+    ``add`` and ``remove`` update the index incrementally; ``refresh`` applies
+    them to the products changed in the database since the last load.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._terms: List[str] = []
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._document_terms: Dict[str, List[str]] = {}
+        self._mark: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def rebuild(self, rows: Optional[Iterable[Dict[str, Any]]] = None) -> None:
+        """Index ``rows`` (all products by default) from scratch."""
+
+        mark = None
+        if rows is None:
+            # Read the mark before the rows: a write racing with the load is at
+            # or above it and is re-indexed by the next refresh.
+            mark = change_mark()
+            rows = Product.objects.values(*DOCUMENT_FIELDS).iterator()
+
+        # Build aside and swap, so searches keep being served during the load.
+        fresh = InMemoryProductIndex()
+        for row in rows:
+            fresh.add(row)
+        with self._lock:
+            self._postings = fresh._postings
+            self._terms = fresh._terms
+            self._documents = fresh._documents
+            self._document_terms = fresh._document_terms
+            self._mark = mark
+
+    def refresh(self) -> None:
+        """
+        Re-index the products changed since the last load, loading everything the first time.
+
+        Only one thread refreshes at a time. Once the index is loaded, the
+        others keep serving it instead of waiting.
+        """
+
+        if not self._refresh_lock.acquire(blocking=self._mark is None):
+            return
+        try:
+            if self._mark is None:
+                self.rebuild()
+                return
+            mark, product_ids = changes_since(self._mark)
+            if product_ids:
+                rows = {
+                    str(row["id"]): row
+                    for row in Product.objects.filter(id__in=product_ids).values(*DOCUMENT_FIELDS)
+                }
+                for product_id in product_ids:
+                    if product_id in rows:
+                        self.add(rows[product_id])
+                    else:
+                        self.remove(product_id)
+            self._mark = mark
+        finally:
+            self._refresh_lock.release()
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """Index or re-index one product row."""
+
+        product_id = str(row["id"])
+        weights: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            value = row.get(field) or ""
+            if isinstance(value, (list, tuple)):
+                value = " ".join(str(item) for item in value)
+            for term in tokenize(str(value)):
+                weights[term] += weight
+
+        with self._lock:
+            self.remove(product_id)
+            for term, weight in weights.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    insort(self._terms, term)
+                postings[product_id] = weight
+            self._documents[product_id] = {
+                "id": product_id,
+                "name": row.get("name", ""),
+                "slug": row.get("slug", ""),
+                "price": row.get("price"),
+                "image_url": row.get("image_url", ""),
+            }
+            self._document_terms[product_id] = list(weights)
+
+    def remove(self, product_id: str) -> None:
+        product_id = str(product_id)
+        with self._lock:
+            for term in self._document_terms.pop(product_id, []):
+                postings = self._postings[term]
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+                    del self._terms[bisect_left(self._terms, term)]
+            self._documents.pop(product_id, None)
+
+    def _expand(self, token: str) -> Iterable[str]:
+        index = bisect_left(self._terms, token)
+        while index < len(self._terms) and self._terms[index].startswith(token):
+            yield self._terms[index]
+            index += 1
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> List[SearchHit]:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            total = len(self._documents)
+            scores: Optional[Dict[str, float]] = None
+            for token in tokens:
+                token_scores: Dict[str, float] = {}
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    factor = 1.0 if term == token else PREFIX_FACTOR
+                    for product_id, weight in postings.items():
+                        score = weight * idf * factor
+                        if score > token_scores.get(product_id, 0.0):
+                            token_scores[product_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        product_id: scores[product_id] + score
+                        for product_id, score in token_scores.items()
+                        if product_id in scores
+                    }
+                if not scores:
+                    return []
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            return [SearchHit(score=score, **self._documents[product_id]) for product_id, score in ranked]
+
+
+class PostgresProductIndex:
+    """
+    Search backed by ``products.search_vector`` and the trigram name index.
+
+    The database keeps both up to date through the ``products`` trigger, so the
+    incremental hooks are no-ops.
+    """
+
+    SQL = """
+        SELECT p.id, p.name, p.slug, p.price, p.image_url,
+               ts_rank(p.search_vector, q.query) + similarity(immutable_unaccent(lower(p.name)), %(folded)s) AS score
+        FROM products p, to_tsquery('simple', %(tsquery)s) AS q(query)
+        WHERE p.search_vector @@ q.query
+           OR immutable_unaccent(lower(p.name)) %% %(folded)s
+        ORDER BY score DESC, p.id
+        LIMIT %(limit)s
+    """
+
+    def rebuild(self, rows: Optional[Iterable[Dict[str, Any]]] = None) -> None:
+        return None
+
+    def refresh(self) -> None:
+        return None
+
+    def add(self, row: Dict[str, Any]) -> None:
+        return None
+
+    def remove(self, product_id: str) -> None:
+        return None
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> List[SearchHit]:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Tokens only contain word characters, so they are safe tsquery lexemes.
+        params = {
+            "tsquery": " & ".join(f"{token}:*" for token in tokens),
+            "folded": " ".join(tokens),
+            "limit": limit,
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(self.SQL, params)
+            return [
+                SearchHit(id=str(row[0]), name=row[1], slug=row[2], price=row[3], image_url=row[4], score=float(row[5]))
+                for row in cursor.fetchall()
+            ]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """Return the configured search backend; the in-memory index is first brought up to date."""
+
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if getattr(settings, "PRODUCT_SEARCH_BACKEND", "postgres") == "memory":
+                    _index = InMemoryProductIndex()
+                else:
+                    _index = PostgresProductIndex()
+    _index.refresh()
+    return _index
+
+
+class ProductSearchView(View):
+    """
+    Ranked product search.
+
+    Query parameters:
+    * ``q``: free text, matched accent- and case-insensitively, by prefix.
+    * ``limit``: number of results, capped at ``MAX_LIMIT``.
+    """
+
+    def get(self, request: HttpRequest) -> JsonResponse:
+        query = request.GET.get("q", "").strip()
+        try:
+            limit = parse_limit(request, DEFAULT_LIMIT, MAX_LIMIT)
+        except ValueError:
+            return JsonResponse({"status": "error", "message": "limit"}, status=400)
+        if not query:
+            return JsonResponse({"status": "ok", "results": []})
+        hits = get_search_index().search(query, limit)
+        return JsonResponse({"status": "ok", "results": [hit.as_dict() for hit in hits]})
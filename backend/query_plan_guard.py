@@ -0,0 +1,392 @@
+"""
+Query-plan regression guard for the order schema.
+
+The hot predicates of the order workflow (active stock rows, open orders of a
+client, ``code`` lookups, ``created_at`` ranges, the order history keyset and
+the stock journal replays above a checkpoint's id mark) are backed by the
+indexes declared on the models in ``backend/django_order_conversion.py`` and
+``django_conversion/client_command.py``. This module loads a large fixture into
+a transaction, runs ``EXPLAIN`` on each critical query and reports every plan
+that falls back to a sequential scan on one of the order tables. The fixture is
+rolled back afterwards, so the guard can run against any PostgreSQL database
+the project can migrate, typically in CI::
+
+    django-admin shell -c "from backend.query_plan_guard import run; run()"
+
+``run`` raises :class:`QueryPlanRegression` when a plan regresses.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Sum, Value
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from backend.django_order_conversion import (
+    Client,
+    CommandeClient,
+    DetailLivraison,
+    DetailProd,
+    Livraison,
+    Magasin,
+    MouvementStock,
+    PointDeVente,
+    Produit,
+)
+from django_conversion import client_command as cc
+
+# Tables on which a sequential scan is treated as a regression.
+GUARDED_TABLES = {
+    model._meta.db_table
+    for model in (
+        CommandeClient,
+        DetailProd,
+        Livraison,
+        DetailLivraison,
+        MouvementStock,
+        cc.CommandeClient,
+        cc.Livraison,
+        cc.DetailLivraison,
+        cc.MouvementStock,
+    )
+}
+
+
+class QueryPlanRegression(AssertionError):
+    """Raised when a critical query is planned with a sequential scan."""
+
+
+@dataclass
+class Fixture:
+    """Identifiers the critical queries use as parameters."""
+
+    client_id: int
+    magasin_id: int
+    produit_id: int
+    commande_code: str
+    livraison_code: str
+    journal_mark: int
+    cc_client_id: int
+    cc_magasin_id: int
+    cc_produit_id: int
+    cc_commande_code: str
+    cc_livraison_code: str
+    cc_journal_mark: int
+
+
+@dataclass
+class PlanViolation:
+    query: str
+    relation: str
+    plan: Dict[str, Any]
+
+
+def load_fixture(scale: int = 50_000, seed: int = 1) -> Fixture:
+    """
+    Insert ``scale`` orders (and proportional stock and delivery rows).
+
+    Row counts are chosen so that the planner has no reason to prefer a
+    sequential scan for any selective predicate.
+    """
+
+    rng = random.Random(seed)
+    user = get_user_model().objects.create(username=f"plan-guard-{seed}")
+    clients = Client.objects.bulk_create([Client(name=f"client {i}") for i in range(max(scale // 50, 1))])
+    magasins = Magasin.objects.bulk_create([Magasin(name=f"magasin {i}") for i in range(20)])
+    point_de_vente = PointDeVente.objects.create(name="pdv")
+    produits = Produit.objects.bulk_create([Produit(name=f"produit {i}") for i in range(max(scale // 20, 1))])
+
+    DetailProd.objects.bulk_create(
+        (
+            DetailProd(produit=produit, magasin=magasin, qte=rng.randint(0, 500), etat=rng.random() > 0.1)
+            for produit in produits
+            for magasin in magasins
+        ),
+        batch_size=5_000,
+    )
+
+    today = timezone.localdate()
+    commandes = CommandeClient.objects.bulk_create(
+        (
+            CommandeClient(
+                client=rng.choice(clients),
+                user=user,
+                code=f"CMDCLT-{i:08d}",
+                lib=f"commande {i}",
+                dat_cmd=today,
+                etat=rng.randint(0, 1),
+                actif=rng.random() > 0.3,
+                magasin=rng.choice(magasins),
+                point_de_vente=point_de_vente,
+            )
+            for i in range(scale)
+        ),
+        batch_size=5_000,
+    )
+    livraisons = Livraison.objects.bulk_create(
+        (
+            Livraison(
+                client=commande.client,
+                commande=commande,
+                user=user,
+                code=f"LIVRAISON-{i:08d}",
+                lib=f"livraison {i}",
+                dat_liv=today,
+                magasin=commande.magasin,
+                point_de_vente=point_de_vente,
+            )
+            for i, commande in enumerate(commandes)
+            if commande.actif
+        ),
+        batch_size=5_000,
+    )
+    details = DetailLivraison.objects.bulk_create(
+        (
+            DetailLivraison(livraison=livraison, produit=rng.choice(produits), qte=rng.randint(1, 5), pa=Decimal("1000"))
+            for livraison in livraisons
+        ),
+        batch_size=5_000,
+    )
+    movements = MouvementStock.objects.bulk_create(
+        (
+            MouvementStock(
+                produit=detail.produit,
+                magasin=detail.livraison.magasin,
+                delta=-detail.qte,
+                source=MouvementStock.SOURCE_LIVRAISON,
+                reference=detail.livraison.code,
+            )
+            for detail in details
+        ),
+        batch_size=5_000,
+    )
+
+    # ``auto_now_add`` stamps every row with the same instant; spread them over
+    # time so ``created_at`` ranges are as selective as in production.
+    for model in (CommandeClient, Livraison, DetailLivraison, MouvementStock):
+        model.objects.update(
+            created_at=ExpressionWrapper(
+                F("created_at") - ExpressionWrapper(F("id") * Value(timedelta(minutes=7)), output_field=DurationField()),
+                output_field=DateTimeField(),
+            )
+        )
+
+    conversion = _load_conversion_fixture(scale, rng)
+
+    with connection.cursor() as cursor:
+        for table in sorted(GUARDED_TABLES):
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+
+    return Fixture(
+        client_id=clients[len(clients) // 2].id,
+        magasin_id=magasins[0].id,
+        produit_id=produits[len(produits) // 2].id,
+        commande_code=commandes[len(commandes) // 2].code,
+        livraison_code=livraisons[len(livraisons) // 2].code,
+        journal_mark=_recent_mark(movements),
+        **conversion,
+    )
+
+
+def _load_conversion_fixture(scale: int, rng: random.Random) -> Dict[str, Any]:
+    """Same volumes for the models of ``django_conversion/client_command.py``."""
+
+    now = timezone.now()
+    clients = cc.Client.objects.bulk_create([cc.Client(name=f"client {i}") for i in range(max(scale // 50, 1))])
+    magasins = cc.Magasin.objects.bulk_create([cc.Magasin(label=f"magasin {i}") for i in range(20)])
+    point_de_vente = cc.PointDeVente.objects.create(label="pdv")
+    produits = cc.Produit.objects.bulk_create([cc.Produit(name=f"produit {i}") for i in range(max(scale // 20, 1))])
+
+    commandes = cc.CommandeClient.objects.bulk_create(
+        (
+            cc.CommandeClient(
+                client=rng.choice(clients),
+                user_id=1,
+                code=f"CMDCLT-{i:08d}",
+                lib=f"commande {i}",
+                dat_cmd=now,
+                etat=rng.random() > 0.5,
+                actif=rng.random() > 0.3,
+                created_at=now - timedelta(minutes=7 * (i + 1)),
+                magasin=rng.choice(magasins),
+                point_de_vente=point_de_vente,
+            )
+            for i in range(scale)
+        ),
+        batch_size=5_000,
+    )
+    livraisons = cc.Livraison.objects.bulk_create(
+        (
+            cc.Livraison(
+                client=commande.client,
+                commande=commande,
+                user_id=1,
+                code=f"LIVRAISON-{i:08d}",
+                lib=f"livraison {i}",
+                dat_liv=commande.created_at,
+                created_at=commande.created_at,
+                magasin=commande.magasin,
+                point_de_vente=point_de_vente,
+            )
+            for i, commande in enumerate(commandes)
+            if commande.actif
+        ),
+        batch_size=5_000,
+    )
+    details = cc.DetailLivraison.objects.bulk_create(
+        (
+            cc.DetailLivraison(
+                livraison=livraison,
+                user_id=1,
+                produit=rng.choice(produits),
+                qte=rng.randint(1, 5),
+                pa=Decimal("1000"),
+                created_at=livraison.created_at,
+                magasin=livraison.magasin,
+                point_de_vente=point_de_vente,
+            )
+            for livraison in livraisons
+        ),
+        batch_size=5_000,
+    )
+    movements = cc.MouvementStock.objects.bulk_create(
+        (
+            cc.MouvementStock(
+                produit=detail.produit,
+                magasin=detail.magasin,
+                delta=-detail.qte,
+                source=cc.MouvementStock.SOURCE_LIVRAISON,
+                reference=detail.livraison.code,
+                created_at=detail.created_at,
+            )
+            for detail in details
+        ),
+        batch_size=5_000,
+    )
+
+    return {
+        "cc_client_id": clients[len(clients) // 2].id,
+        "cc_magasin_id": magasins[0].id,
+        "cc_produit_id": produits[len(produits) // 2].id,
+        "cc_commande_code": commandes[len(commandes) // 2].code,
+        "cc_livraison_code": livraisons[len(livraisons) // 2].code,
+        "cc_journal_mark": _recent_mark(movements),
+    }
+
+
+def _recent_mark(movements: List[Any]) -> int:
+    """An id mark leaving about 1% of the journal to replay, like a recent checkpoint."""
+
+    return movements[-max(len(movements) // 100, 1)].id
+
+
+def critical_queries(fixture: Fixture) -> Dict[str, QuerySet]:
+    """The queries whose plans must stay index-backed."""
+
+    now = timezone.now()
+    return {
+        "active_stock": DetailProd.objects.filter(
+            magasin_id=fixture.magasin_id, produit_id=fixture.produit_id, etat=True
+        ).values("qte"),
+        "client_open_orders": CommandeClient.objects.filter(client_id=fixture.client_id, etat=0, actif=True),
+        "client_history_page": CommandeClient.objects.filter(client_id=fixture.client_id).order_by(
+            "-created_at", "-id"
+        )[:20],
+        "commande_by_code": CommandeClient.objects.filter(code=fixture.commande_code),
+        "livraison_by_code": Livraison.objects.filter(code=fixture.livraison_code),
+        "commandes_of_the_day": CommandeClient.objects.filter(
+            created_at__gte=now - timedelta(days=1), created_at__lt=now
+        ),
+        "product_deliveries_of_the_week": DetailLivraison.objects.filter(
+            produit_id=fixture.produit_id, created_at__gte=now - timedelta(days=7)
+        ),
+        "cc_client_open_orders": cc.CommandeClient.objects.filter(
+            client_id=fixture.cc_client_id, etat=False, actif=True
+        ),
+        "cc_client_history_page": cc.CommandeClient.objects.filter(client_id=fixture.cc_client_id).order_by(
+            "-created_at", "-id"
+        )[:20],
+        "cc_commande_by_code": cc.CommandeClient.objects.filter(code=fixture.cc_commande_code),
+        "cc_livraison_by_code": cc.Livraison.objects.filter(code=fixture.cc_livraison_code),
+        "cc_commandes_of_the_day": cc.CommandeClient.objects.filter(
+            created_at__gte=now - timedelta(days=1), created_at__lt=now
+        ),
+        "cc_livraisons_of_the_day": cc.Livraison.objects.filter(
+            created_at__gte=now - timedelta(days=1), created_at__lt=now
+        ),
+        "cc_store_product_deliveries_of_the_week": cc.DetailLivraison.objects.filter(
+            magasin_id=fixture.cc_magasin_id,
+            produit_id=fixture.cc_produit_id,
+            created_at__gte=now - timedelta(days=7),
+        ),
+        "journal_store_replay": MouvementStock.objects.filter(
+            magasin_id=fixture.magasin_id, id__gt=fixture.journal_mark, created_at__lte=now
+        )
+        .values("produit_id")
+        .annotate(total=Sum("delta")),
+        "journal_store_product_replay": MouvementStock.objects.filter(
+            magasin_id=fixture.magasin_id, produit_id=fixture.produit_id, id__gt=fixture.journal_mark
+        )
+        .values("produit_id")
+        .annotate(total=Sum("delta")),
+        "cc_journal_store_replay": cc.MouvementStock.objects.filter(
+            magasin_id=fixture.cc_magasin_id, id__gt=fixture.cc_journal_mark, created_at__lte=now
+        )
+        .values("produit_id")
+        .annotate(total=Sum("delta")),
+        "cc_journal_store_product_replay": cc.MouvementStock.objects.filter(
+            magasin_id=fixture.cc_magasin_id, produit_id=fixture.cc_produit_id, id__gt=fixture.cc_journal_mark
+        )
+        .values("produit_id")
+        .annotate(total=Sum("delta")),
+    }
+
+
+def _walk(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(queryset: QuerySet) -> Dict[str, Any]:
+    """Return the root node of the JSON ``EXPLAIN`` of ``queryset``."""
+
+    return json.loads(queryset.explain(format="json"))[0]["Plan"]
+
+
+def find_violations(queries: Dict[str, QuerySet]) -> List[PlanViolation]:
+    violations: List[PlanViolation] = []
+    for name, queryset in queries.items():
+        plan = explain(queryset)
+        for node in _walk(plan):
+            if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in GUARDED_TABLES:
+                violations.append(PlanViolation(query=name, relation=node["Relation Name"], plan=plan))
+    return violations
+
+
+def run(scale: int = 50_000, queries: Callable[[Fixture], Dict[str, QuerySet]] = critical_queries) -> None:
+    """Load the fixture, check every critical plan, roll back, and raise on regressions."""
+
+    if connection.vendor != "postgresql":
+        raise RuntimeError("the query plan guard requires PostgreSQL")
+
+    with transaction.atomic():
+        fixture = load_fixture(scale)
+        violations = find_violations(queries(fixture))
+        transaction.set_rollback(True)
+
+    if violations:
+        details = "\n".join(
+            f"- {violation.query}: sequential scan on {violation.relation}\n{json.dumps(violation.plan, indent=2)}"
+            for violation in violations
+        )
+        raise QueryPlanRegression(f"critical queries fell back to sequential scans:\n{details}")
@@ -0,0 +1,363 @@
+"""
+Stock movement journal with periodic per-store checkpoints.
+
+``DetailProd.qte`` only holds the current level and is overwritten in place,
+so answering "what was the stock of X in store Y on date D" used to mean
+replaying every ``DetailLivraison`` since the beginning. Every delivery and
+manual adjustment now also appends signed ``MouvementStock`` rows, written in
+bulk, and ``StockCheckpoint`` snapshots bound the cost of any historical
+lookup to one checkpoint plus the movements recorded after it.
+
+A movement's ``created_at`` is stamped before its transaction commits, so a
+timestamp cannot tell which movements a checkpoint has seen. Each checkpoint
+instead records a high-water mark of journal ids, read while holding a
+``SHARE`` lock on the journal: every movement at or below the mark is committed
+and included, and replays continue from ``id > mark``.
+
+Checkpoints are built incrementally from the closest earlier one by mark, and
+can be verified against a full replay of the journal. Both operations run in
+parallel across stores, each worker using its own database connection.
+
+The order schema (``backend/django_order_conversion.py``) and the
+``django_conversion/client_command.py`` schema keep separate journals; the
+checkpoint and replay functions take the :class:`Journal` to work on, the order
+journal by default.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+
+from django.db import connection, models, transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from backend.django_order_conversion import (
+    DetailProd,
+    Magasin,
+    MouvementStock,
+    StockCheckpoint,
+    StockCheckpointLine,
+)
+from django_conversion import client_command as cc
+
+DEFAULT_WORKERS = 4
+
+T = TypeVar("T")
+
+
+class UnknownStockRow(ValueError):
+    """Raised when a store has no active ``DetailProd`` row for a product."""
+
+
+@dataclass(frozen=True)
+class Journal:
+    """The models holding one schema's stock journal and its checkpoints."""
+
+    magasin: Type[models.Model]
+    mouvement: Type[models.Model]
+    checkpoint: Type[models.Model]
+    line: Type[models.Model]
+
+
+ORDER_JOURNAL = Journal(Magasin, MouvementStock, StockCheckpoint, StockCheckpointLine)
+CLIENT_COMMAND_JOURNAL = Journal(cc.Magasin, cc.MouvementStock, cc.StockCheckpoint, cc.StockCheckpointLine)
+
+
+@dataclass
+class StockMovement:
+    """A movement to append to the journal; ``delta`` is negative for stock leaving the store."""
+
+    produit_id: int
+    magasin_id: int
+    delta: int
+    source: str
+    reference: str = ""
+    created_at: Optional[datetime] = None
+
+
+def record_movements(movements: Iterable[StockMovement]) -> int:
+    """Append ``movements`` to the journal with a single bulk insert."""
+
+    rows = [
+        MouvementStock(
+            produit_id=movement.produit_id,
+            magasin_id=movement.magasin_id,
+            delta=movement.delta,
+            source=movement.source,
+            reference=movement.reference,
+            created_at=movement.created_at or timezone.now(),
+        )
+        for movement in movements
+        if movement.delta
+    ]
+    MouvementStock.objects.bulk_create(rows, batch_size=1_000)
+    return len(rows)
+
+
+def record_opening_balances(magasin_id: int, reference: str = "ouverture du journal") -> int:
+    """
+    Journal the current active ``DetailProd`` levels of a store as its opening stock.
+
+    Each opening movement is the difference between ``DetailProd.qte`` and what
+    the journal already holds, so deliveries journaled before the opening are
+    not counted twice. A store is opened once; later calls record nothing.
+    """
+
+    with transaction.atomic():
+        # Serializes concurrent openings of the same store.
+        Magasin.objects.select_for_update().filter(pk=magasin_id).first()
+        if MouvementStock.objects.filter(magasin_id=magasin_id, source=MouvementStock.SOURCE_OUVERTURE).exists():
+            return 0
+
+        levels = dict(
+            DetailProd.objects.filter(magasin_id=magasin_id, etat=True)
+            .values("produit_id")
+            .annotate(qte=Sum("qte"))
+            .values_list("produit_id", "qte")
+        )
+        journal = _journal_totals(ORDER_JOURNAL, magasin_id)
+        return record_movements(
+            StockMovement(
+                produit_id=produit_id,
+                magasin_id=magasin_id,
+                delta=qte - journal.get(produit_id, 0),
+                source=MouvementStock.SOURCE_OUVERTURE,
+                reference=reference,
+            )
+            for produit_id, qte in levels.items()
+        )
+
+
+@transaction.atomic
+def adjust_stock(magasin_id: int, produit_id: int, delta: int, reference: str) -> None:
+    """Apply a manual stock correction and journal it; raises :class:`UnknownStockRow` without a stock row."""
+
+    updated = DetailProd.objects.filter(magasin_id=magasin_id, produit_id=produit_id, etat=True).update(
+        qte=F("qte") + delta
+    )
+    if not updated:
+        raise UnknownStockRow(magasin_id, produit_id)
+    record_movements(
+        [
+            StockMovement(
+                produit_id=produit_id,
+                magasin_id=magasin_id,
+                delta=delta,
+                source=MouvementStock.SOURCE_AJUSTEMENT,
+                reference=reference,
+            )
+        ]
+    )
+
+
+def _journal_totals(
+    journal: Journal,
+    magasin_id: int,
+    after_id: Optional[int] = None,
+    until_id: Optional[int] = None,
+    until: Optional[datetime] = None,
+    produit_id: Optional[int] = None,
+) -> Dict[int, int]:
+    """Net movement per product for ids in ``(after_id, until_id]`` stamped up to ``until``."""
+
+    movements = journal.mouvement.objects.filter(magasin_id=magasin_id)
+    if after_id is not None:
+        movements = movements.filter(id__gt=after_id)
+    if until_id is not None:
+        movements = movements.filter(id__lte=until_id)
+    if until is not None:
+        movements = movements.filter(created_at__lte=until)
+    if produit_id is not None:
+        movements = movements.filter(produit_id=produit_id)
+    return dict(movements.values("produit_id").annotate(total=Sum("delta")).values_list("produit_id", "total"))
+
+
+def journal_high_water_mark(journal: Journal = ORDER_JOURNAL) -> Tuple[datetime, int]:
+    """
+    Return ``(taken_at, mark)`` such that every movement with ``id <= mark`` is committed.
+
+    The ``SHARE`` lock waits for in-flight journal writers and is released as
+    soon as the mark is read, so inserts are only held up for that instant.
+    Sequence ids handed out afterwards are all above the mark.
+    """
+
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                table = connection.ops.quote_name(journal.mouvement._meta.db_table)
+                cursor.execute(f"LOCK TABLE {table} IN SHARE MODE")
+        mark = journal.mouvement.objects.aggregate(mark=Max("id"))["mark"] or 0
+        return timezone.now(), mark
+
+
+def latest_checkpoint(
+    magasin_id: int, at: Optional[datetime] = None, journal: Journal = ORDER_JOURNAL
+) -> Optional[StockCheckpoint]:
+    """Most recent checkpoint of the store, taken at or before ``at`` when given."""
+
+    checkpoints = journal.checkpoint.objects.filter(magasin_id=magasin_id)
+    if at is not None:
+        checkpoints = checkpoints.filter(taken_at__lte=at)
+    return checkpoints.order_by("-taken_at").first()
+
+
+def store_stock_at(magasin_id: int, at: datetime, journal: Journal = ORDER_JOURNAL) -> Dict[int, int]:
+    """Stock of every product of a store at ``at``: one checkpoint plus a short replay."""
+
+    checkpoint = latest_checkpoint(magasin_id, at, journal)
+    levels: Dict[int, int] = {}
+    mark = None
+    if checkpoint is not None:
+        levels = dict(checkpoint.lines.values_list("produit_id", "qte"))
+        mark = checkpoint.last_mouvement_id
+    for produit_id, total in _journal_totals(journal, magasin_id, after_id=mark, until=at).items():
+        levels[produit_id] = levels.get(produit_id, 0) + total
+    return levels
+
+
+def stock_at(produit_id: int, magasin_id: int, at: datetime, journal: Journal = ORDER_JOURNAL) -> int:
+    """Stock of one product in a store at ``at``."""
+
+    checkpoint = latest_checkpoint(magasin_id, at, journal)
+    level = 0
+    mark = None
+    if checkpoint is not None:
+        level = checkpoint.lines.filter(produit_id=produit_id).values_list("qte", flat=True).first() or 0
+        mark = checkpoint.last_mouvement_id
+    totals = _journal_totals(journal, magasin_id, after_id=mark, until=at, produit_id=produit_id)
+    return level + totals.get(produit_id, 0)
+
+
+def build_checkpoint(
+    magasin_id: int,
+    taken_at: Optional[datetime] = None,
+    mark: Optional[int] = None,
+    journal: Journal = ORDER_JOURNAL,
+) -> StockCheckpoint:
+    """
+    Snapshot a store from its closest earlier checkpoint and the movements since.
+
+    ``taken_at`` and ``mark`` come from :func:`journal_high_water_mark`, read
+    here unless given (``build_checkpoints`` shares one mark across stores).
+    The starting checkpoint is the one with the highest mark not above
+    ``mark``, so a build retried with an older mark never counts newer
+    movements.
+    """
+
+    if taken_at is None or mark is None:
+        taken_at, mark = journal_high_water_mark(journal)
+
+    with transaction.atomic():
+        # Serializes builds of the same store.
+        journal.magasin.objects.select_for_update().filter(pk=magasin_id).first()
+        existing = journal.checkpoint.objects.filter(magasin_id=magasin_id, taken_at=taken_at).first()
+        if existing is not None:
+            return existing
+
+        previous = (
+            journal.checkpoint.objects.filter(magasin_id=magasin_id, last_mouvement_id__lte=mark)
+            .order_by("-last_mouvement_id", "-taken_at")
+            .first()
+        )
+        levels: Dict[int, int] = {}
+        after_id = None
+        if previous is not None:
+            levels = dict(previous.lines.values_list("produit_id", "qte"))
+            after_id = previous.last_mouvement_id
+        for produit_id, total in _journal_totals(journal, magasin_id, after_id=after_id, until_id=mark).items():
+            levels[produit_id] = levels.get(produit_id, 0) + total
+
+        checkpoint = journal.checkpoint.objects.create(magasin_id=magasin_id, taken_at=taken_at, last_mouvement_id=mark)
+        journal.line.objects.bulk_create(
+            (
+                journal.line(checkpoint=checkpoint, produit_id=produit_id, qte=qte)
+                for produit_id, qte in levels.items()
+                if qte
+            ),
+            batch_size=1_000,
+        )
+        return checkpoint
+
+
+def verify_checkpoint(checkpoint: StockCheckpoint, journal: Journal = ORDER_JOURNAL) -> Dict[int, Tuple[int, int]]:
+    """
+    Compare a checkpoint with a full replay of the journal up to its mark.
+
+    Returns ``{produit_id: (checkpoint_qte, replayed_qte)}`` for every product
+    whose levels disagree; an empty dict means the checkpoint is sound.
+    """
+
+    recorded = dict(checkpoint.lines.values_list("produit_id", "qte"))
+    replayed = _journal_totals(journal, checkpoint.magasin_id, until_id=checkpoint.last_mouvement_id)
+    return {
+        produit_id: (recorded.get(produit_id, 0), replayed.get(produit_id, 0))
+        for produit_id in recorded.keys() | replayed.keys()
+        if recorded.get(produit_id, 0) != replayed.get(produit_id, 0)
+    }
+
+
+def stock_discrepancies(magasin_id: int) -> Dict[int, Tuple[int, int]]:
+    """Products whose active ``DetailProd.qte`` differs from the journal: ``{produit_id: (qte, journal)}``."""
+
+    current = dict(
+        DetailProd.objects.filter(magasin_id=magasin_id, etat=True)
+        .values("produit_id")
+        .annotate(qte=Sum("qte"))
+        .values_list("produit_id", "qte")
+    )
+    journal = store_stock_at(magasin_id, timezone.now())
+    return {
+        produit_id: (current.get(produit_id, 0), journal.get(produit_id, 0))
+        for produit_id in current.keys() | journal.keys()
+        if current.get(produit_id, 0) != journal.get(produit_id, 0)
+    }
+
+
+def _per_store(
+    func: Callable[[int], T], magasin_ids: Optional[List[int]], workers: int, journal: Journal
+) -> Dict[int, T]:
+    """Run ``func`` for each store on a thread pool, one database connection per worker."""
+
+    if magasin_ids is None:
+        magasin_ids = list(journal.magasin.objects.order_by("id").values_list("id", flat=True))
+
+    def task(magasin_id: int) -> T:
+        try:
+            return func(magasin_id)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(magasin_ids, executor.map(task, magasin_ids)))
+
+
+def build_checkpoints(
+    magasin_ids: Optional[List[int]] = None,
+    workers: int = DEFAULT_WORKERS,
+    journal: Journal = ORDER_JOURNAL,
+) -> Dict[int, StockCheckpoint]:
+    """Checkpoint every store (or ``magasin_ids``) at one shared high-water mark, in parallel."""
+
+    taken_at, mark = journal_high_water_mark(journal)
+    return _per_store(
+        lambda magasin_id: build_checkpoint(magasin_id, taken_at, mark, journal), magasin_ids, workers, journal
+    )
+
+
+def verify_checkpoints(
+    at: Optional[datetime] = None,
+    magasin_ids: Optional[List[int]] = None,
+    workers: int = DEFAULT_WORKERS,
+    journal: Journal = ORDER_JOURNAL,
+) -> Dict[int, Dict[int, Tuple[int, int]]]:
+    """Verify the latest checkpoint (taken at or before ``at``) of every store, in parallel."""
+
+    def verify(magasin_id: int) -> Dict[int, Tuple[int, int]]:
+        checkpoint = latest_checkpoint(magasin_id, at, journal)
+        return verify_checkpoint(checkpoint, journal) if checkpoint is not None else {}
+
+    return _per_store(verify, magasin_ids, workers, journal)
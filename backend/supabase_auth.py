@@ -0,0 +1,41 @@
+"""
+Resolution of the Supabase user behind a storefront request.
+
+Storefront rows such as ``cart.user_id`` reference ``auth.users(id)``, a UUID
+owned by Supabase Auth, not the Django user's primary key. The storefront sends
+the Supabase session access token as ``Authorization: Bearer <jwt>``; it is
+verified with the project's JWT secret (``settings.SUPABASE_JWT_SECRET``) and
+its ``sub`` claim is the user id.
+"""
+
+from __future__ import annotations
+
+import uuid
+
+import jwt
+from django.conf import settings
+from django.http import HttpRequest
+
+SUPABASE_JWT_AUDIENCE = "authenticated"
+
+
+class SupabaseAuthError(Exception):
+    """Raised when a request carries no valid Supabase access token."""
+
+
+def supabase_user_id(request: HttpRequest) -> uuid.UUID:
+    """Return the ``auth.users`` id of the verified bearer token of ``request``."""
+
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise SupabaseAuthError("missing bearer token")
+    try:
+        claims = jwt.decode(
+            token,
+            settings.SUPABASE_JWT_SECRET,
+            algorithms=["HS256"],
+            audience=SUPABASE_JWT_AUDIENCE,
+        )
+        return uuid.UUID(str(claims["sub"]))
+    except (jwt.InvalidTokenError, KeyError, ValueError) as exc:
+        raise SupabaseAuthError("invalid access token") from exc
@@ -5,7 +5,9 @@ The original PHP script:
     - Consumes a ``CMDCLT`` session cart and request parameters to create a customer
       command (``CMDCLT``) along with detail lines.
     - Optionally records a payment when the invoice values match.
-    - Optionally generates a delivery record and adjusts inventory.
+    - Optionally generates a delivery record and adjusts inventory, which is
+      recorded in the append-only ``MouvementStock`` journal (checkpointed and
+      replayed by ``backend.stock_journal``).
 
 This module provides a single ``create_client_command`` view function that mirrors
 those behaviors using Django ORM patterns, transactional integrity, and explicit
@@ -54,6 +56,14 @@ class CommandeClient(models.Model):
     magasin = models.ForeignKey(Magasin, on_delete=models.PROTECT)
     point_de_vente = models.ForeignKey(PointDeVente, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["client", "etat", "actif"], name="cc_client_etat_actif_idx"),
+            models.Index(fields=["client", "-created_at", "-id"], name="cc_client_history_idx"),
+            models.Index(fields=["code"], name="cc_code_idx"),
+            models.Index(fields=["created_at"], name="cc_created_at_idx"),
+        ]
+
 
 class Produit(models.Model):
     name = models.CharField(max_length=255)
@@ -86,6 +96,12 @@ class Livraison(models.Model):
     magasin = models.ForeignKey(Magasin, on_delete=models.PROTECT)
     point_de_vente = models.ForeignKey(PointDeVente, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["code"], name="cc_livraison_code_idx"),
+            models.Index(fields=["created_at"], name="cc_livraison_created_at_idx"),
+        ]
+
 
 class DetailLivraison(models.Model):
     livraison = models.ForeignKey(Livraison, on_delete=models.CASCADE)
@@ -98,6 +114,55 @@ class DetailLivraison(models.Model):
     magasin = models.ForeignKey(Magasin, on_delete=models.PROTECT)
     point_de_vente = models.ForeignKey(PointDeVente, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["magasin", "produit", "created_at"], name="cc_detailliv_stock_idx"),
+        ]
+
+
+class MouvementStock(models.Model):
+    """Append-only stock journal for this schema; ``delta`` is signed."""
+
+    SOURCE_LIVRAISON = "livraison"
+
+    produit = models.ForeignKey(Produit, on_delete=models.PROTECT)
+    magasin = models.ForeignKey(Magasin, on_delete=models.PROTECT)
+    delta = models.IntegerField()
+    source = models.CharField(max_length=20)
+    reference = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["magasin", "id"], name="cc_mvtstock_mag_id_idx"),
+            models.Index(fields=["magasin", "produit", "id"], name="cc_mvtstock_mag_prod_id_idx"),
+        ]
+
+
+class StockCheckpoint(models.Model):
+    """Stock levels of a store covering the movements with ``id <= last_mouvement_id``."""
+
+    magasin = models.ForeignKey(Magasin, on_delete=models.PROTECT)
+    taken_at = models.DateTimeField()
+    last_mouvement_id = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["magasin", "taken_at"], name="cc_stockcheckpoint_mag_taken_uniq"),
+        ]
+
+
+class StockCheckpointLine(models.Model):
+    checkpoint = models.ForeignKey(StockCheckpoint, on_delete=models.CASCADE, related_name="lines")
+    produit = models.ForeignKey(Produit, on_delete=models.PROTECT)
+    qte = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["checkpoint", "produit"], name="cc_stockcheckpointline_uniq"),
+        ]
+
 
 # --- Domain helpers --------------------------------------------------------
 
@@ -268,9 +333,17 @@ def create_client_command(request):
                         point_de_vente=point_de_vente,
                     )
                 )
-                # Inventory adjustments would normally happen through a service
-                # layer; add the necessary hooks here when integrating.
         DetailLivraison.objects.bulk_create(detail_liv_rows)
+        MouvementStock.objects.bulk_create(
+            MouvementStock(
+                produit=row.produit,
+                magasin=magasin,
+                delta=-row.qte,
+                source=MouvementStock.SOURCE_LIVRAISON,
+                reference=livraison.code,
+            )
+            for row in detail_liv_rows
+        )
 
         command.actif = True
         command.save(update_fields=["actif"])
@@ -175,6 +175,8 @@ function App() {
             <p className="text-sm text-amber-800">
               Ajoutez les variables <code>VITE_SUPABASE_URL</code> et <code>VITE_SUPABASE_ANON_KEY</code>
               pour activer le chargement des produits et des catégories.
+              <code>VITE_API_URL</code> (optionnelle) pointe vers l'API Django&nbsp;: le panier l'utilise
+              pour grouper ses mises à jour et passe sinon directement par Supabase.
             </p>
           </div>
         )}
@@ -1,19 +1,16 @@
-import { createContext, useContext, useEffect, useState, ReactNode } from 'react';
+import { createContext, useContext, useEffect, useRef, useState, ReactNode } from 'react';
 import { supabase } from '../lib/supabase';
+import {
+  CartApiItem,
+  CartDelta,
+  CartOperation,
+  StaleCartError,
+  fetchCartSnapshot,
+  postCartOperations,
+} from '../lib/cartApi';
 import { useAuth } from './AuthContext';
 
-interface CartItem {
-  id: string;
-  product_id: string;
-  quantity: number;
-  size: string;
-  color: string;
-  product?: {
-    name: string;
-    price: number;
-    image_url: string;
-  };
-}
+type CartItem = CartApiItem;
 
 interface CartContextType {
   cart: CartItem[];
@@ -27,34 +24,38 @@ interface CartContextType {
 
 const CartContext = createContext<CartContextType | undefined>(undefined);
 
+const applyDelta = (items: CartItem[], delta: CartDelta): CartItem[] => {
+  const removed = new Set(delta.removed);
+  const changed = new Map(delta.changed.map((item) => [item.id, item]));
+  const next = items
+    .filter((item) => !removed.has(item.id))
+    .map((item) => changed.get(item.id) ?? item);
+  const known = new Set(next.map((item) => item.id));
+  return [...next, ...delta.changed.filter((item) => !known.has(item.id))];
+};
+
 export function CartProvider({ children }: { children: ReactNode }) {
   const [cart, setCart] = useState<CartItem[]>([]);
   const [loading, setLoading] = useState(true);
   const { user } = useAuth();
+  const version = useRef<number | null>(null);
+  // Mutations are sent one batch at a time so each carries the latest version.
+  const queue = useRef<Promise<void>>(Promise.resolve());
 
   const fetchCart = async () => {
-    if (!supabase) {
+    if (!supabase || !user) {
+      version.current = null;
       setCart([]);
       setLoading(false);
       return;
     }
 
-    if (!user) {
-      setCart([]);
-      setLoading(false);
-      return;
-    }
-
-    const { data, error } = await supabase
-      .from('cart')
-      .select(`
-        *,
-        product:products(name, price, image_url)
-      `)
-      .eq('user_id', user.id);
-
-    if (!error && data) {
-      setCart(data as CartItem[]);
+    try {
+      const snapshot = await fetchCartSnapshot();
+      version.current = snapshot.version;
+      setCart(snapshot.items);
+    } catch (error) {
+      console.error(error);
     }
     setLoading(false);
   };
@@ -63,68 +64,57 @@ export function CartProvider({ children }: { children: ReactNode }) {
     fetchCart();
   }, [user]);
 
+  const mutate = (operations: CartOperation[]) => {
+    const run = async () => {
+      if (!supabase || !user || operations.length === 0) return;
+      if (version.current === null) {
+        await fetchCart();
+      }
+
+      try {
+        const delta = await postCartOperations(version.current ?? 0, operations);
+        version.current = delta.version;
+        setCart((items) => applyDelta(items, delta));
+      } catch (error) {
+        if (!(error instanceof StaleCartError)) {
+          console.error(error);
+          return;
+        }
+        // Another tab or device changed the cart: reload it once and replay.
+        await fetchCart();
+        try {
+          const delta = await postCartOperations(version.current ?? 0, operations);
+          version.current = delta.version;
+          setCart((items) => applyDelta(items, delta));
+        } catch (retryError) {
+          console.error(retryError);
+        }
+      }
+    };
+
+    queue.current = queue.current.then(run);
+    return queue.current;
+  };
+
   const addToCart = async (productId: string, quantity: number, size: string, color: string) => {
-    if (!supabase || !user) return;
-
-    const { error } = await supabase
-      .from('cart')
-      .upsert({
-        user_id: user.id,
-        product_id: productId,
-        quantity,
-        size,
-        color,
-      }, {
-        onConflict: 'user_id,product_id,size,color',
-      });
-
-    if (!error) {
-      await fetchCart();
-    }
+    await mutate([{ op: 'set', product_id: productId, size, color, quantity }]);
   };
 
   const updateQuantity = async (itemId: string, quantity: number) => {
-    if (!supabase) return;
-
     if (quantity <= 0) {
       await removeFromCart(itemId);
       return;
     }
 
-    const { error } = await supabase
-      .from('cart')
-      .update({ quantity })
-      .eq('id', itemId);
-
-    if (!error) {
-      await fetchCart();
-    }
+    await mutate([{ op: 'set', id: itemId, quantity }]);
   };
 
   const removeFromCart = async (itemId: string) => {
-    if (!supabase) return;
-
-    const { error } = await supabase
-      .from('cart')
-      .delete()
-      .eq('id', itemId);
-
-    if (!error) {
-      await fetchCart();
-    }
+    await mutate([{ op: 'remove', id: itemId }]);
   };
 
   const clearCart = async () => {
-    if (!supabase || !user) return;
-
-    const { error } = await supabase
-      .from('cart')
-      .delete()
-      .eq('user_id', user.id);
-
-    if (!error) {
-      setCart([]);
-    }
+    await mutate(cart.map((item) => ({ op: 'remove' as const, id: item.id })));
   };
 
   const getCartTotal = () => {
@@ -0,0 +1,174 @@
+import { supabase } from './supabase';
+
+// Optional Django API. Without it the cart talks to Supabase directly, with
+// one request per operation and no version check.
+const apiUrl = import.meta.env.VITE_API_URL;
+
+export const isCartApiConfigured = Boolean(apiUrl);
+
+const CART_SELECT = '*, product:products(name, price, image_url)';
+
+export interface CartApiItem {
+  id: string;
+  product_id: string;
+  quantity: number;
+  size: string;
+  color: string;
+  product?: {
+    name: string;
+    price: number;
+    image_url: string;
+  } | null;
+}
+
+export type CartOperation =
+  | { op: 'set' | 'add'; product_id: string; size: string; color: string; quantity: number }
+  | { op: 'set'; id: string; quantity: number }
+  | { op: 'remove'; id: string };
+
+export interface CartDelta {
+  version: number;
+  changed: CartApiItem[];
+  removed: string[];
+}
+
+export class StaleCartError extends Error {
+  constructor() {
+    super('stale cart version');
+  }
+}
+
+// Prices are serialized as decimal strings by the API.
+const normalize = (item: CartApiItem): CartApiItem => ({
+  ...item,
+  product: item.product ? { ...item.product, price: Number(item.product.price) } : item.product,
+});
+
+const request = async (method: 'GET' | 'POST', body?: unknown) => {
+  if (!apiUrl || !supabase) {
+    throw new Error('cart API is not configured');
+  }
+
+  const { data: { session } } = await supabase.auth.getSession();
+  const response = await fetch(`${apiUrl}/cart/`, {
+    method,
+    headers: {
+      'Content-Type': 'application/json',
+      Authorization: `Bearer ${session?.access_token ?? ''}`,
+    },
+    body: body === undefined ? undefined : JSON.stringify(body),
+  });
+
+  if (response.status === 409) {
+    throw new StaleCartError();
+  }
+  if (!response.ok) {
+    throw new Error(`cart API error ${response.status}`);
+  }
+  return response.json();
+};
+
+const sessionUserId = async (): Promise<string> => {
+  if (!supabase) {
+    throw new Error('Supabase is not configured');
+  }
+  const { data: { session } } = await supabase.auth.getSession();
+  if (!session) {
+    throw new Error('no Supabase session');
+  }
+  return session.user.id;
+};
+
+const fetchDirect = async (): Promise<{ version: number; items: CartApiItem[] }> => {
+  const userId = await sessionUserId();
+  const { data, error } = await supabase!
+    .from('cart')
+    .select(CART_SELECT)
+    .eq('user_id', userId)
+    .order('created_at');
+  if (error) {
+    throw error;
+  }
+  return { version: 0, items: (data as unknown as CartApiItem[]).map(normalize) };
+};
+
+const postDirect = async (operations: CartOperation[]): Promise<CartDelta> => {
+  const userId = await sessionUserId();
+  const changed: CartApiItem[] = [];
+  const removed: string[] = [];
+
+  for (const operation of operations) {
+    if (operation.op === 'remove') {
+      const { error } = await supabase!.from('cart').delete().eq('id', operation.id);
+      if (error) throw error;
+      removed.push(operation.id);
+      continue;
+    }
+
+    if ('id' in operation) {
+      const { data, error } = await supabase!
+        .from('cart')
+        .update({ quantity: operation.quantity })
+        .eq('id', operation.id)
+        .select(CART_SELECT)
+        .single();
+      if (error) throw error;
+      changed.push(data as unknown as CartApiItem);
+      continue;
+    }
+
+    let quantity = operation.quantity;
+    if (operation.op === 'add') {
+      const { data: line, error } = await supabase!
+        .from('cart')
+        .select('id, quantity')
+        .match({ user_id: userId, product_id: operation.product_id, size: operation.size, color: operation.color })
+        .maybeSingle();
+      if (error) throw error;
+      quantity += line?.quantity ?? 0;
+      // Mirrors the API: a line brought to zero or less is removed.
+      if (quantity <= 0) {
+        if (line) {
+          const { error: deleteError } = await supabase!.from('cart').delete().eq('id', line.id);
+          if (deleteError) throw deleteError;
+          removed.push(line.id);
+        }
+        continue;
+      }
+    }
+
+    const { data, error } = await supabase!
+      .from('cart')
+      .upsert({
+        user_id: userId,
+        product_id: operation.product_id,
+        quantity,
+        size: operation.size,
+        color: operation.color,
+      }, {
+        onConflict: 'user_id,product_id,size,color',
+      })
+      .select(CART_SELECT)
+      .single();
+    if (error) throw error;
+    changed.push(data as unknown as CartApiItem);
+  }
+
+  return { version: 0, changed: changed.map(normalize), removed };
+};
+
+export const fetchCartSnapshot = async (): Promise<{ version: number; items: CartApiItem[] }> => {
+  if (!isCartApiConfigured) {
+    return fetchDirect();
+  }
+  const { version, items } = await request('GET');
+  return { version, items: items.map(normalize) };
+};
+
+export const postCartOperations = async (version: number, operations: CartOperation[]): Promise<CartDelta> => {
+  if (!isCartApiConfigured) {
+    return postDirect(operations);
+  }
+  const { changed, removed, version: nextVersion } = await request('POST', { version, operations });
+  return { version: nextVersion, changed: changed.map(normalize), removed };
+};
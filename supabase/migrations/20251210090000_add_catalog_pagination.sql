@@ -0,0 +1,85 @@
+/*
+  # Catalog pagination and cache invalidation support
+
+  1. Modified Tables
+    - `products`
+      - `featured` and `created_at` become NOT NULL (existing NULLs are
+        backfilled) so every product has a well-defined keyset position.
+
+  2. Indexes
+    - `products_keyset_idx` on `products (featured DESC, created_at DESC, id DESC)`
+      backs the keyset pagination of the product grid.
+    - `products_category_keyset_idx` on the same key prefixed by `category_id`
+      backs the category-filtered grid.
+
+  3. New Tables
+    - `catalog_state`
+      - `id` (smallint, primary key, always 1)
+      - `version` (bigint, bumped on every write to `products` or `categories`)
+      - `updated_at` (timestamp)
+
+  4. Triggers
+    - Statement-level triggers on `products` and `categories` bump
+      `catalog_state.version` so cached catalog pages are invalidated whatever
+      client performed the write.
+
+  5. Security
+    - Enable RLS on `catalog_state` with public read access.
+*/
+
+UPDATE products SET featured = false WHERE featured IS NULL;
+UPDATE products SET created_at = now() WHERE created_at IS NULL;
+
+ALTER TABLE products
+  ALTER COLUMN featured SET NOT NULL,
+  ALTER COLUMN created_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS products_keyset_idx
+  ON products (featured DESC, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS products_category_keyset_idx
+  ON products (category_id, featured DESC, created_at DESC, id DESC);
+
+-- Catalog version table
+CREATE TABLE IF NOT EXISTS catalog_state (
+  id smallint PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version bigint NOT NULL DEFAULT 1,
+  updated_at timestamptz DEFAULT now()
+);
+
+INSERT INTO catalog_state (id) VALUES (1)
+ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE catalog_state ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Anyone can view catalog state"
+  ON catalog_state FOR SELECT
+  TO public
+  USING (true);
+
+CREATE OR REPLACE FUNCTION bump_catalog_version()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  UPDATE catalog_state
+  SET version = version + 1,
+      updated_at = now()
+  WHERE id = 1;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS products_bump_catalog_version ON products;
+CREATE TRIGGER products_bump_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS categories_bump_catalog_version ON categories;
+CREATE TRIGGER categories_bump_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON categories
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION bump_catalog_version();
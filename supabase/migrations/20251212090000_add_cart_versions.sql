@@ -0,0 +1,61 @@
+/*
+  # Cart version counters
+
+  1. New Tables
+    - `cart_versions`
+      - `user_id` (uuid, primary key, foreign key to auth.users)
+      - `version` (bigint, bumped on every write to the user's cart)
+      - `updated_at` (timestamp)
+
+  2. Triggers
+    - A row-level trigger on `cart` bumps the owner's `cart_versions.version`
+      on every insert, update and delete, so clients holding the current
+      version know their local cart is exact, whichever path wrote to it.
+
+  3. Security
+    - Enable RLS on `cart_versions`; users can only read their own counter.
+*/
+
+CREATE TABLE IF NOT EXISTS cart_versions (
+  user_id uuid PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+  version bigint NOT NULL DEFAULT 0,
+  updated_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE cart_versions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own cart version"
+  ON cart_versions FOR SELECT
+  TO authenticated
+  USING (auth.uid() = user_id);
+
+CREATE OR REPLACE FUNCTION bump_cart_version()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  owner uuid;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    owner := OLD.user_id;
+  ELSE
+    owner := NEW.user_id;
+  END IF;
+
+  INSERT INTO cart_versions (user_id, version, updated_at)
+  VALUES (owner, 1, now())
+  ON CONFLICT (user_id) DO UPDATE
+    SET version = cart_versions.version + 1,
+        updated_at = now();
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS cart_bump_version ON cart;
+CREATE TRIGGER cart_bump_version
+  AFTER INSERT OR UPDATE OR DELETE ON cart
+  FOR EACH ROW
+  EXECUTE FUNCTION bump_cart_version();
@@ -0,0 +1,70 @@
+/*
+  # Product search index
+
+  1. Extensions
+    - `unaccent` for accent folding ("Robe Élégante" matches "robe elegante").
+    - `pg_trgm` for fuzzy matching on product names.
+
+  2. Functions
+    - `immutable_unaccent(text)`: immutable wrapper around `unaccent` so it can
+      be used in index expressions.
+    - `products_search_vector_update()`: builds `products.search_vector` from
+      the accent-folded name (weight A), colors and sizes (weight B) and
+      description (weight C).
+
+  3. Modified Tables
+    - `products`
+      - `search_vector` (tsvector, maintained by trigger on every write)
+
+  4. Indexes
+    - `products_search_vector_idx`: GIN index on `search_vector`.
+    - `products_name_trgm_idx`: GIN trigram index on the folded product name.
+*/
+
+CREATE EXTENSION IF NOT EXISTS unaccent WITH SCHEMA extensions;
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
+
+CREATE OR REPLACE FUNCTION immutable_unaccent(value text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+STRICT
+AS $$
+  SELECT extensions.unaccent('extensions.unaccent'::regdictionary, value);
+$$;
+
+ALTER TABLE products
+  ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION products_search_vector_update()
+RETURNS trigger
+LANGUAGE plpgsql
+SET search_path = public, extensions
+AS $$
+BEGIN
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', immutable_unaccent(lower(coalesce(NEW.name, '')))), 'A') ||
+    setweight(to_tsvector('simple', immutable_unaccent(lower(
+      coalesce((SELECT string_agg(value, ' ') FROM jsonb_array_elements_text(NEW.colors)), '') || ' ' ||
+      coalesce((SELECT string_agg(value, ' ') FROM jsonb_array_elements_text(NEW.sizes)), '')
+    ))), 'B') ||
+    setweight(to_tsvector('simple', immutable_unaccent(lower(coalesce(NEW.description, '')))), 'C');
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS products_search_vector_trigger ON products;
+CREATE TRIGGER products_search_vector_trigger
+  BEFORE INSERT OR UPDATE OF name, description, colors, sizes ON products
+  FOR EACH ROW
+  EXECUTE FUNCTION products_search_vector_update();
+
+-- Backfill existing rows through the trigger.
+UPDATE products SET name = name;
+
+CREATE INDEX IF NOT EXISTS products_search_vector_idx
+  ON products USING gin (search_vector);
+
+CREATE INDEX IF NOT EXISTS products_name_trgm_idx
+  ON products USING gin (immutable_unaccent(lower(name)) extensions.gin_trgm_ops);
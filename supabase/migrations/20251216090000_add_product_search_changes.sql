@@ -0,0 +1,61 @@
+/*
+  # Product search change log
+
+  1. New Tables
+    - `product_search_changes`
+      - `product_id` (uuid, primary key; no foreign key so deletions are kept)
+      - `txid` (bigint, id of the last transaction that changed the product)
+      - `changed_at` (timestamp)
+
+  2. Triggers
+    - A row-level trigger on `products` records every insert, delete and
+      update of a searchable column (`name`, `slug`, `price`, `image_url`,
+      `description`, `colors`, `sizes`). Stock updates are not recorded.
+      Processes holding an in-memory search index re-index only the products
+      whose `txid` is at or above the snapshot `xmin` of their last refresh,
+      so a change committed late is never skipped.
+
+  3. Indexes
+    - `product_search_changes_txid_idx` on `txid` backs the refresh query.
+
+  4. Security
+    - Enable RLS on `product_search_changes` without public policies; only
+      the backend reads it.
+*/
+
+CREATE TABLE IF NOT EXISTS product_search_changes (
+  product_id uuid PRIMARY KEY,
+  txid bigint NOT NULL,
+  changed_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS product_search_changes_txid_idx
+  ON product_search_changes (txid);
+
+ALTER TABLE product_search_changes ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION log_product_search_change()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  INSERT INTO product_search_changes (product_id, txid, changed_at)
+  VALUES (
+    CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+    pg_current_xact_id()::text::bigint,
+    now()
+  )
+  ON CONFLICT (product_id) DO UPDATE
+    SET txid = EXCLUDED.txid,
+        changed_at = EXCLUDED.changed_at;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS products_log_search_change ON products;
+CREATE TRIGGER products_log_search_change
+  AFTER INSERT OR DELETE OR UPDATE OF name, slug, price, image_url, description, colors, sizes ON products
+  FOR EACH ROW
+  EXECUTE FUNCTION log_product_search_change();